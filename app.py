@@ -1,70 +1,217 @@
 import streamlit as st
 import googlemaps
-from datetime import datetime
-from itertools import product
+import pandas as pd
+import re
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import lru_cache
 
-# Use Streamlit secrets for API key
-API_KEY = st.secrets["GOOGLE_MAPS_API_KEY"]
+CACHE_TTL = 86400  # seconds to keep geocoding and drive time results
+CACHE_MAX_ENTRIES = 4096
+NEGATIVE_CACHE_TTL = 300  # seconds to keep addresses Google could not resolve
+DEPARTURE_BUCKET_MINUTES = 5
 
-# Initialize the Google Maps client
-gmaps = googlemaps.Client(key=API_KEY)
+# Distance Matrix limits: 25 origins or destinations and 100 elements per request
+MATRIX_MAX_SIDE = 25
+MATRIX_MAX_ELEMENTS = 100
 
-def validate_address(address):
+MAX_WORKERS = 8
+# Client-side throttle at the Geocoding API's per-second limit, so bursts from
+# the worker threads queue locally instead of failing with OVER_QUERY_LIMIT
+MAPS_QUERIES_PER_SECOND = 50
+
+WHITESPACE_RE = re.compile(r"\s+")
+
+# Addresses are validated once, on form submit, and remembered across reruns
+STATE_DEFAULTS = {
+    'validated': dict,
+    'session_tokens': dict,
+    'picked_suggestions': dict
+}
+
+# Build the client once per process so its connection pool survives reruns
+@st.cache_resource(show_spinner=False)
+def get_gmaps():
+    # Use Streamlit secrets for API key
+    return googlemaps.Client(key=st.secrets["GOOGLE_MAPS_API_KEY"],
+                             timeout=10,
+                             queries_per_second=MAPS_QUERIES_PER_SECOND,
+                             retry_over_query_limit=True)
+
+# Fold case and inner whitespace so "Main st" and "main  st" share a cache entry
+@lru_cache(maxsize=8192)
+def normalize_address(address):
+    return WHITESPACE_RE.sub(" ", address.strip().casefold())
+
+def departure_bucket(now):
+    # Round up to the next bucket: the API rejects departure times in the past
+    floored = now.replace(second=0, microsecond=0) - timedelta(minutes=now.minute % DEPARTURE_BUCKET_MINUTES)
+    return floored + timedelta(minutes=DEPARTURE_BUCKET_MINUTES)
+
+# Raised inside the day-long cache so misses only land in the short-lived one
+class AddressNotFound(LookupError):
+    pass
+
+# Errors are raised rather than returned so failed lookups are not cached.
+# Lookups are also called from worker threads, so they must not render anything.
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def _formatted_address(query):
+    geocode_result = get_gmaps().geocode(query)
+    if not geocode_result:
+        raise AddressNotFound(query)
+    return geocode_result[0]['formatted_address']
+
+# Session tokens group autocomplete and place lookups for billing; the leading
+# underscore keeps them out of the cache key.
+@st.cache_data(ttl=NEGATIVE_CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def _geocode(query, _session_token=None):
     try:
-        geocode_result = gmaps.geocode(address)
-        if geocode_result:
-            return geocode_result[0]['formatted_address'], None
-        else:
-            autocomplete_result = gmaps.places_autocomplete(address)
-            suggestions = [result['description'] for result in autocomplete_result[:3]]
-            return None, suggestions
-    except Exception as e:
-        st.error(f"Error validating address: {e}")
-        return None, None
+        return _formatted_address(query), None
+    except AddressNotFound:
+        pass
+    autocomplete_result = get_gmaps().places_autocomplete(query, session_token=_session_token)
+    suggestions = tuple({'description': result['description'], 'place_id': result['place_id']}
+                        for result in autocomplete_result[:3])
+    return None, suggestions
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def _place_address(place_id, _session_token=None):
+    place = get_gmaps().place(place_id, session_token=_session_token, fields=["formatted_address"])
+    return place['result']['formatted_address']
 
-def get_driving_time(origin, destination):
-    now = datetime.now()
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def _distance_matrix(origins, destinations, departure_time):
+    matrix = get_gmaps().distance_matrix(list(origins),
+                                         list(destinations),
+                                         mode="driving",
+                                         departure_time=departure_time,
+                                         traffic_model="best_guess")
+    times = {}
+    for origin, row in zip(origins, matrix['rows']):
+        for destination, element in zip(destinations, row['elements']):
+            if element['status'] == 'OK' and 'duration_in_traffic' in element:
+                times[(origin, destination)] = round(element['duration_in_traffic']['value'] / 60)  # Convert seconds to minutes
+    return times
+
+def matrix_chunks(origins, destinations):
+    # Split an origins x destinations matrix into sub-matrices within the API limits
+    origin_size = min(MATRIX_MAX_SIDE, len(origins))
+    dest_size = min(MATRIX_MAX_SIDE, MATRIX_MAX_ELEMENTS // origin_size)
+    return [(tuple(origins[i:i + origin_size]), tuple(destinations[j:j + dest_size]))
+            for i in range(0, len(origins), origin_size)
+            for j in range(0, len(destinations), dest_size)]
+
+def get_place_address(place_id, session_token):
     try:
-        directions_result = gmaps.directions(origin,
-                                             destination,
-                                             mode="driving",
-                                             departure_time=now)
-        if directions_result:
-            duration = directions_result[0]['legs'][0]['duration_in_traffic']['value']
-            return round(duration / 60)  # Convert seconds to minutes
-        else:
-            return None
+        return _place_address(place_id, session_token)
     except Exception as e:
-        st.error(f"Error getting driving time: {e}")
+        st.error(f"Error validating address: {e}")
         return None
 
+def validate_addresses(addresses, session_tokens):
+    # Validate addresses concurrently; errors are reported here on the script thread.
+    # Addresses that normalize to the same query are looked up once.
+    queries = {}
+    for address in addresses:
+        queries.setdefault(normalize_address(address), address)
+    if not queries:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(len(queries), MAX_WORKERS)) as executor:
+        futures = {query: executor.submit(_geocode, query, session_tokens[address])
+                   for query, address in queries.items()}
+    query_results = {}
+    for query, future in futures.items():
+        try:
+            query_results[query] = future.result()
+        except Exception as e:
+            st.error(f"Error validating address: {e}")
+    return {address: query_results[normalize_address(address)]
+            for address in addresses if normalize_address(address) in query_results}
+
+def split_lines(text):
+    return list(dict.fromkeys(line.strip() for line in text.split('\n') if line.strip()))
+
+def resolve_address(name, key):
+    # Show the validation result for an entered address and return its formatted address
+    valid_address, suggestions = st.session_state.validated[name]
+    if valid_address:
+        st.success(f"Validated address: {valid_address}")
+        return valid_address
+    if suggestions:
+        place_ids = {suggestion['description']: suggestion['place_id'] for suggestion in suggestions}
+        # Nothing is preselected, so Place Details only runs once the user picks a suggestion
+        choice = st.selectbox(f"Address not found for '{name}'. Did you mean one of these?", list(place_ids),
+                              index=None, key=key)
+        if choice:
+            picked_choice, valid_address = st.session_state.picked_suggestions.get(name, (None, None))
+            if picked_choice != choice:
+                # Resolve the picked suggestion directly, closing its autocomplete session
+                valid_address = get_place_address(place_ids[choice], st.session_state.session_tokens.get(name))
+                if valid_address:
+                    st.session_state.picked_suggestions[name] = (choice, valid_address)
+                    # The closed session's token must not be reused; a later pick starts a new one
+                    st.session_state.session_tokens[name] = uuid.uuid4().hex
+            if valid_address:
+                st.success(f"Validated address: {valid_address}")
+                return valid_address
+        return None
+    st.error(f"Invalid address: {name}. Please try again.")
+    return None
+
+def get_driving_times(origins, destinations, departure_time, include_return=False):
+    # Returns {(origin, destination): minutes} for every pair that could be routed
+    if not origins or not destinations:
+        return {}
+    chunks = matrix_chunks(origins, destinations)
+    if include_return:
+        chunks += matrix_chunks(destinations, origins)
+    with ThreadPoolExecutor(max_workers=min(len(chunks), MAX_WORKERS)) as executor:
+        futures = [executor.submit(_distance_matrix, chunk_origins, chunk_destinations, departure_time)
+                   for chunk_origins, chunk_destinations in chunks]
+    times = {}
+    for future in futures:
+        try:
+            times.update(future.result())
+        except Exception as e:
+            st.error(f"Error getting driving times: {e}")
+    return times
+
 def main():
     st.title("Drive Time Calculator")
 
     trip_type = st.radio("Select trip type:", ("Return", "One-way"))
 
+    for key, factory in STATE_DEFAULTS.items():
+        st.session_state.setdefault(key, factory())
+
+    with st.form("addresses"):
+        start_input = st.text_area("Enter start points (one per line):")
+        dest_input = st.text_area("Enter destinations (one per line):")
+        submitted = st.form_submit_button("Validate Addresses")
+
+    start_names = split_lines(start_input)
+    dest_names = split_lines(dest_input)
+    if submitted:
+        validated = st.session_state.validated
+        # Misses are retried; the short negative cache decides whether Google is called again
+        new_names = [name for name in dict.fromkeys(start_names + dest_names)
+                     if name not in validated or validated[name][0] is None]
+        for name in new_names:
+            st.session_state.session_tokens.setdefault(name, uuid.uuid4().hex)
+        st.session_state.validated.update(validate_addresses(new_names, st.session_state.session_tokens))
+
     start_points = {}
     destinations = {}
 
     st.header("Start Points")
-    while True:
-        start_point = st.text_input(f"Enter start point {len(start_points) + 1}", key=f"start_{len(start_points)}")
-        if start_point:
-            valid_address, suggestions = validate_address(start_point)
+    for start_name in start_names:
+        if start_name in st.session_state.validated:
+            valid_address = resolve_address(start_name, key=f"suggest_start_{start_name}")
             if valid_address:
-                start_points[start_point] = valid_address
-                st.success(f"Validated address: {valid_address}")
-            elif suggestions:
-                choice = st.selectbox(f"Address not found. Did you mean one of these?", suggestions, key=f"suggest_start_{len(start_points)}")
-                if choice:
-                    valid_address, _ = validate_address(choice)
-                    if valid_address:
-                        start_points[start_point] = valid_address
-                        st.success(f"Validated address: {valid_address}")
-            else:
-                st.error(f"Invalid address: {start_point}. Please try again.")
+                start_points[start_name] = valid_address
         else:
-            break
+            st.warning(f"Could not validate address: {start_name}. Please resubmit.")
 
     st.header("Destinations")
     if trip_type == "One-way" or len(start_points) > 1:
@@ -72,43 +219,56 @@ def main():
             if st.checkbox(f"Use '{start_name}' as a destination too?"):
                 destinations[start_name] = start_address
 
-    while True:
-        destination = st.text_input(f"Enter destination {len(destinations) + 1}", key=f"dest_{len(destinations)}")
-        if destination:
-            valid_address, suggestions = validate_address(destination)
+    for dest_name in dest_names:
+        if dest_name in st.session_state.validated:
+            valid_address = resolve_address(dest_name, key=f"suggest_dest_{dest_name}")
             if valid_address:
-                destinations[destination] = valid_address
-                st.success(f"Validated address: {valid_address}")
-            elif suggestions:
-                choice = st.selectbox(f"Address not found. Did you mean one of these?", suggestions, key=f"suggest_dest_{len(destinations)}")
-                if choice:
-                    valid_address, _ = validate_address(choice)
-                    if valid_address:
-                        destinations[destination] = valid_address
-                        st.success(f"Validated address: {valid_address}")
-            else:
-                st.error(f"Invalid address: {destination}. Please try again.")
+                destinations[dest_name] = valid_address
         else:
-            break
+            st.warning(f"Could not validate address: {dest_name}. Please resubmit.")
 
     if st.button("Calculate Drive Times"):
         st.header("Results")
-        for start_name, start_address in start_points.items():
-            for end_name, end_address in destinations.items():
-                if start_address != end_address:
-                    outbound_duration = get_driving_time(start_address, end_address)
-                    if outbound_duration:
-                        if trip_type == "Return":
-                            inbound_duration = get_driving_time(end_address, start_address)
-                            if inbound_duration:
-                                total_duration = outbound_duration + inbound_duration
-                                st.write(f"{start_name} -> {end_name} -> {start_name}: {total_duration} mins [{outbound_duration} mins out, {inbound_duration} mins back]")
-                            else:
-                                st.warning(f"Could not calculate return time for {start_name} -> {end_name} -> {start_name}")
-                        else:
-                            st.write(f"{start_name} -> {end_name}: {outbound_duration} minutes")
-                    else:
-                        st.warning(f"Could not calculate time for {start_name} -> {end_name}")
+        # One departure time for the whole calculation keeps every request on the same cache key
+        departure_time = departure_bucket(datetime.now())
+        # Several names can resolve to the same address; request each address once
+        start_addresses = list(dict.fromkeys(start_points.values()))
+        dest_addresses = list(dict.fromkeys(destinations.values()))
+        driving_times = get_driving_times(start_addresses,
+                                          dest_addresses,
+                                          departure_time,
+                                          include_return=trip_type == "Return")
+        jobs = [(start_name, start_address, end_name, end_address)
+                for start_name, start_address in start_points.items()
+                for end_name, end_address in destinations.items()
+                if start_address != end_address]
+        # Collect every row first and render the results as a single table
+        rows = []
+        failed_routes = []
+        for start_name, start_address, end_name, end_address in jobs:
+            outbound_duration = driving_times.get((start_address, end_address))
+            if trip_type == "Return":
+                route = f"{start_name} -> {end_name} -> {start_name}"
+                inbound_duration = driving_times.get((end_address, start_address))
+                if outbound_duration is None or inbound_duration is None:
+                    failed_routes.append(route)
+                else:
+                    rows.append({
+                        "Route": route,
+                        "Total (mins)": outbound_duration + inbound_duration,
+                        "Out (mins)": outbound_duration,
+                        "Back (mins)": inbound_duration
+                    })
+            else:
+                route = f"{start_name} -> {end_name}"
+                if outbound_duration is None:
+                    failed_routes.append(route)
+                else:
+                    rows.append({"Route": route, "Total (mins)": outbound_duration})
+        if rows:
+            st.dataframe(pd.DataFrame(rows), width="stretch", hide_index=True)
+        if failed_routes:
+            st.warning(f"Could not calculate time for: {', '.join(failed_routes)}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,98 +1,164 @@
 import streamlit as st
+import pandas as pd
+import orjson
+import re
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-# Load API key from Streamlit secrets
-API_KEY = st.secrets["GOOGLE_MAPS_API_KEY"]
+# Request settings shared by every call, built once rather than per request
+SEARCH_URL = "https://places.googleapis.com/v1/places:searchText"
+# Only the top matches are offered as alternatives, so only those are requested
+MAX_ALTERNATIVES = 5
+SEARCH_HEADERS = {
+    "X-Goog-FieldMask": "places.id,places.displayName,places.formattedAddress,places.rating,places.userRatingCount"
+}
 
 # ----------------------------
 # Helper Functions
 # ----------------------------
 
-def perform_request(url, headers=None, params=None, data=None):
+CACHE_TTL = 86400  # seconds to keep Text Search results
+CACHE_MAX_ENTRIES = 4096
+NEGATIVE_CACHE_TTL = 300  # seconds to keep searches that matched no places
+# Lookups run concurrently, up to one per pooled connection
+POOL_MAXSIZE = 32
+REQUEST_TIMEOUT = (2, 5)  # (connect, read) seconds
+
+WHITESPACE_RE = re.compile(r"\s+")
+
+@st.cache_resource(show_spinner=False)
+def get_session():
+    """
+    Build one shared session per process so pooled keep-alive connections survive reruns.
     """
-    Perform an HTTP request and handle errors.
+    session = requests.Session()
+    # Load API key from Streamlit secrets on first use rather than at import.
+    # Places API (New) reads the key from a header; per-endpoint headers are passed per call.
+    session.headers.update({"X-Goog-Api-Key": st.secrets["GOOGLE_MAPS_API_KEY"]})
+    session.mount("https://", HTTPAdapter(
+        pool_connections=16,
+        pool_maxsize=POOL_MAXSIZE,
+        # Text Search is a read-only POST, so it is safe to retry
+        max_retries=Retry(
+            total=3,
+            backoff_factor=0.3,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["POST"]
+        )
+    ))
+    return session
+
+def perform_request(url, headers=None, data=None):
+    """
+    POST a JSON body and return the decoded JSON response.
+    Raises requests.RequestException on failure so errors are never cached.
     """
+    response = get_session().post(url, headers=headers, json=data, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
     try:
-        if data:
-            response = requests.post(url, headers=headers, json=data)
-        elif params:
-            response = requests.get(url, params=params, headers=headers)
-        else:
-            response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
-        st.error(f"An error occurred during the API request: {e}")
-        return None
-
-def get_place_suggestions(original_input):
-    """
-    Fetch place suggestions based on the original input using Google's Text Search API.
-    """
-    search_url = "https://maps.googleapis.com/maps/api/place/textsearch/json"
-    params = {
-        "query": original_input,
-        "key": API_KEY,
-        "language": "en"
+        return orjson.loads(response.content)
+    except orjson.JSONDecodeError as e:
+        raise requests.RequestException(f"Invalid JSON response: {e}", response=response) from e
+
+def report_request_error(error):
+    """
+    Surface a failed API request to the user.
+    """
+    st.error(f"An error occurred during the API request: {error}")
+
+@lru_cache(maxsize=8192)
+def normalize_query(text):
+    """
+    Fold case and whitespace so equivalent queries share a cache entry.
+    """
+    return WHITESPACE_RE.sub(" ", text.strip().casefold())
+
+def parse_search_result(place):
+    """
+    Convert a Places API (New) search result into an alternative with inline details.
+    """
+    details = {
+        "name": place.get("displayName", {}).get("text", "N/A"),
+        "address": place.get("formattedAddress", "N/A"),
+        "rating": place.get("rating", "N/A"),
+        "total_ratings": place.get("userRatingCount", "N/A")
+    }
+    return {
+        "display": f"{details['name']} :: {details['address']}",
+        "place_id": place["id"],
+        "details": details
     }
 
-    result = perform_request(search_url, params=params)
-    if result and "results" in result:
-        # Return list of dicts with 'display' and 'place_id'
-        return [
-            {
-                "display": f"{place['name']} :: {place['formatted_address']}",
-                "place_id": place["place_id"]
-            }
-            for place in result["results"]
-        ]
-    return []
-
-def get_place_details(place_id):
-    """
-    Fetch detailed information about a specific place using Google's Place Details API.
-    """
-    details_url = "https://maps.googleapis.com/maps/api/place/details/json"
-    params = {
-        "place_id": place_id,
-        "fields": "name,formatted_address,rating,user_ratings_total",
-        "key": API_KEY,
-        "language": "en"
+class NoPlacesFound(LookupError):
+    """
+    Raised when a search has no matches, so the miss is not cached for the full TTL.
+    """
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def fetch_search_results(query):
+    """
+    Fetch matching places for a normalized query using the Places API (New) Text Search.
+    The field mask returns each result's details, so no separate Details call is needed.
+    """
+    data = {
+        "textQuery": query,
+        "languageCode": "en",
+        "pageSize": MAX_ALTERNATIVES
     }
 
-    result = perform_request(details_url, params=params)
-    if result and "result" in result:
-        place = result["result"]
-        return {
-            "name": place.get("name", "N/A"),
-            "address": place.get("formatted_address", "N/A"),
-            "rating": place.get("rating", "N/A"),
-            "total_ratings": place.get("user_ratings_total", "N/A")
-        }
-    return None
+    result = perform_request(SEARCH_URL, headers=SEARCH_HEADERS, data=data)
+    if result and result.get("places"):
+        return [parse_search_result(place) for place in result["places"]]
+    raise NoPlacesFound(query)
+
+@st.cache_data(ttl=NEGATIVE_CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def search_places(query):
+    """
+    Search for places, remembering queries without matches for a few minutes.
+    """
+    try:
+        return fetch_search_results(query)
+    except NoPlacesFound:
+        return []
 
 def find_place(original_input):
     """
-    Find place suggestions and limit to top 5 alternatives.
+    Find the top alternatives for the input along with the best match's details.
+    Runs on worker threads, so request errors are raised rather than reported.
+    """
+    alternatives = search_places(normalize_query(original_input))[:MAX_ALTERNATIVES]
+    if not alternatives:
+        return alternatives, None
+    return alternatives, alternatives[0]['details']
+
+def place_key(details):
+    """
+    Identify a place by name and address for duplicate detection.
     """
-    alternatives = get_place_suggestions(original_input)
-    return alternatives[:5] if alternatives else []
+    return (details['name'], details['address'])
 
 def generate_table(places):
     """
-    Generate and display the results table using Streamlit's native table display.
+    Generate and display the results table as a single DataFrame.
     """
     if places:
-        table_data = {
-            "Place Name": [place['details']['name'] for place in places],
-            "Address": [place['details']['address'] for place in places],
-            "Number of Reviews": [place['details']['total_ratings'] for place in places],
-            "Score": [
-                f"{place['details']['rating']:.1f}" if isinstance(place['details']['rating'], (int, float)) else place['details']['rating']
-                for place in places
-            ]
-        }
-        st.table(table_data)
+        df = pd.DataFrame(
+            [place['details'] for place in places],
+            columns=["name", "address", "total_ratings", "rating"]
+        )
+        # Missing values come back as "N/A"; coerce so each column has one type
+        df["total_ratings"] = pd.to_numeric(df["total_ratings"], errors="coerce").astype("Int64")
+        df["rating"] = pd.to_numeric(df["rating"], errors="coerce").round(1)
+        df = df.rename(columns={
+            "name": "Place Name",
+            "address": "Address",
+            "total_ratings": "Number of Reviews",
+            "rating": "Score"
+        })
+        st.dataframe(df, width="stretch", hide_index=True)
     else:
         st.warning("No places added yet. Add some places to see results.")
 
@@ -100,14 +166,21 @@ def generate_table(places):
 # Session State Initialization
 # ----------------------------
 
+# Factories for each session state variable's initial value.
+# Places are keyed by the place_id of their original best match, which stays
+# stable for widget keys even when another alternative is selected.
+STATE_DEFAULTS = {
+    'places': dict,
+    'place_keys': set,
+    'places_input': str
+}
+
 def init_session_state():
     """
     Initialize session state variables if they do not exist.
     """
-    if 'places' not in st.session_state:
-        st.session_state.places = []
-    if 'places_input' not in st.session_state:
-        st.session_state.places_input = ''
+    for key, factory in STATE_DEFAULTS.items():
+        st.session_state.setdefault(key, factory())
 
 # ----------------------------
 # Callback Functions
@@ -117,8 +190,30 @@ def clear_all():
     """
     Clear all session state data and reset the page.
     """
-    st.session_state.places = []
-    st.session_state.places_input = ''
+    for key, factory in STATE_DEFAULTS.items():
+        st.session_state[key] = factory()
+
+def remove_place(place_id):
+    """
+    Remove a place before the script reruns, so the list renders without it.
+    """
+    place = st.session_state.places.pop(place_id, None)
+    if place:
+        refresh_place_keys()
+        st.success(f"Removed: {place['details']['name']} - {place['details']['address']}")
+
+def place_label(place_id):
+    """
+    Describe a stored place by its current name and address.
+    """
+    details = st.session_state.places[place_id]['details']
+    return f"{details['name']} - {details['address']}"
+
+def refresh_place_keys():
+    """
+    Rebuild the duplicate-detection keys after places are removed or changed.
+    """
+    st.session_state.place_keys = {place_key(place['details']) for place in st.session_state.places.values()}
 
 # ----------------------------
 # Main Application
@@ -139,40 +234,55 @@ def main():
     st.button("Clear All", on_click=clear_all)
 
     # ----------------------------
-    # Input Area for Place Names
+    # Input Area and Submit Button
     # ----------------------------
-    # The value parameter ensures the text area reflects the current session state
-    places_input = st.text_area(
-        "Enter place names (one per line):",
-        value=st.session_state.places_input,
-        key="places_input"
-    )
+    # A form keeps typing in the text area from rerunning the script
+    with st.form("submit_form", clear_on_submit=False):
+        # The value parameter ensures the text area reflects the current session state
+        places_input = st.text_area(
+            "Enter place names (one per line):",
+            value=st.session_state.places_input,
+            key="places_input"
+        )
+        submitted = st.form_submit_button("Submit Places")
 
-    # ----------------------------
-    # Submit Places Button
-    # ----------------------------
-    if st.button("Submit Places"):
+    if submitted:
         place_names = [name.strip() for name in places_input.split('\n') if name.strip()]
+        # Names that normalize to the same query are only looked up once
+        unique_names = {}
         for place_name in place_names:
-            alternatives = find_place(place_name)
+            unique_names.setdefault(normalize_query(place_name), place_name)
+        place_names = list(unique_names.values())
+        # Look up all names concurrently; session state is only touched on this thread
+        futures = []
+        if place_names:
+            with st.spinner("Fetching place details..."):
+                with ThreadPoolExecutor(max_workers=min(len(place_names), POOL_MAXSIZE)) as executor:
+                    futures = [executor.submit(find_place, place_name) for place_name in place_names]
+        for place_name, future in zip(place_names, futures):
+            try:
+                alternatives, details = future.result()
+            except requests.RequestException as e:
+                report_request_error(e)
+                continue
             if alternatives:
                 # Automatically select the best match (first alternative)
                 best_match = alternatives[0]
-                with st.spinner(f"Fetching details for '{best_match['display'].split(' :: ')[0]}'..."):
-                    details = get_place_details(best_match['place_id'])
                 if details:
-                    # Check for duplicates based on name and address
-                    if not any(
-                        existing_place['details']['name'] == details['name'] and 
-                        existing_place['details']['address'] == details['address'] 
-                        for existing_place in st.session_state.places
-                    ):
-                        st.session_state.places.append({
+                    # Check for duplicates based on name and address, and skip a best
+                    # match already stored under its place_id so that entry is not replaced
+                    key = place_key(details)
+                    if key not in st.session_state.place_keys and best_match['place_id'] not in st.session_state.places:
+                        st.session_state.place_keys.add(key)
+                        # Precompute the selectbox data once rather than on every rerun
+                        display_to_alternative = {alt['display']: alt for alt in alternatives}
+                        st.session_state.places[best_match['place_id']] = {
                             'original_input': place_name,
-                            'alternatives': alternatives,
-                            'selected': best_match['place_id'],
+                            'display_to_alternative': display_to_alternative,
+                            'display_options': list(display_to_alternative),
+                            'default_index': 0,
                             'details': details
-                        })
+                        }
                         st.success(f"Added: {details['name']} - {details['address']}")
             else:
                 st.error(f"No matches found for '{place_name}'. Try a different name.")
@@ -182,75 +292,45 @@ def main():
     # ----------------------------
     if st.session_state.places:
         st.subheader("Review and Modify Places")
-        for i, place in enumerate(st.session_state.places):
-            alternatives = place['alternatives']
-            if alternatives:
-                # Get list of display strings
-                display_options = [alt['display'] for alt in alternatives]
-                # Get mapping from display string to place_id
-                display_to_id = {alt['display']: alt['place_id'] for alt in alternatives}
-                # Get current selected place_id
-                current_place_id = place['selected']
-                # Get current display string
-                current_display = next(
-                    (alt['display'] for alt in alternatives if alt['place_id'] == current_place_id),
-                    display_options[0]
-                )
-                # Find the index of current_display
-                default_index = display_options.index(current_display) if current_display in display_options else 0
+        for place_id, place in st.session_state.places.items():
+            display_options = place['display_options']
+            if display_options:
+                default_index = place['default_index']
+                current_display = display_options[default_index]
                 # Unique key for each selectbox
-                select_key = f"select_{i}"
-                # Render the selectbox and remove button in the same row
-                col1, col2 = st.columns([4, 1])
-                with col1:
-                    selected_display = st.selectbox(
-                        f"Select alternative for '{place['original_input']}':",
-                        options=display_options,
-                        index=default_index,
-                        key=select_key
-                    )
-                with col2:
-                    remove_button = st.button("Remove", key=f"remove_button_{i}")
-                    if remove_button:
-                        del st.session_state.places[i]
-                        st.success(f"Removed: {place['details']['name']} - {place['details']['address']}")
-                        st.experimental_rerun()  # Rerun to update the UI immediately
+                select_key = f"select_{place_id}"
+                selected_display = st.selectbox(
+                    f"Select alternative for '{place['original_input']}':",
+                    options=display_options,
+                    index=default_index,
+                    key=select_key
+                )
 
                 # Check if the selected option has changed
                 if selected_display != current_display:
-                    selected_place_id = display_to_id[selected_display]
-                    with st.spinner(f"Fetching details for '{selected_display.split(' :: ')[0]}'..."):
-                        new_details = get_place_details(selected_place_id)
-                    if new_details:
-                        # Update the place's 'selected' and 'details'
-                        st.session_state.places[i]['selected'] = selected_place_id
-                        st.session_state.places[i]['details'] = new_details
-                        st.success(f"Updated to: {new_details['name']} - {new_details['address']}")
+                    # The search already returned every alternative's details
+                    selected_alternative = place['display_to_alternative'][selected_display]
+                    new_details = selected_alternative['details']
+                    # Update the place's selected index and 'details'
+                    place['default_index'] = display_options.index(selected_display)
+                    place['details'] = new_details
+                    refresh_place_keys()
+                    st.success(f"Updated to: {new_details['name']} - {new_details['address']}")
+
+        # A single remove control replaces a Remove button and column pair per place
+        remove_target = st.selectbox(
+            "Select a place to remove:",
+            options=list(st.session_state.places),
+            format_func=place_label,
+            key="remove_target"
+        )
+        st.button("Remove", on_click=remove_place, args=(remove_target,))
 
     # ----------------------------
     # Results Table
     # ----------------------------
     if len(st.session_state.places) > 1:
-        generate_table(st.session_state.places)
-
-    # ----------------------------
-    # Prevent Displaying Code as Text
-    # ----------------------------
-    # Ensure no triple-quoted strings or improperly commented code are present.
-    # All comments should use '#' for single-line comments.
-
-    # Example of proper commenting:
-    # st.subheader("Current Places")
-    # for i, place in enumerate(st.session_state.places):
-    #     st.write(f"{i+1}. {place['details']['name']} :: {place['details']['address']}")
-    #     # Buttons to remove place
-    #     col1, col2 = st.columns(2)
-    #     with col1:
-    #         if st.button(f"Remove {i}", key=f"remove_button_{i}"):
-    #             del st.session_state.places[i]
-    #             st.success(f"Removed: {place['details']['name']} - {place['details']['address']}")
-    #             break  # Exit loop to avoid index errors
-    #     st.write("---")
+        generate_table(list(st.session_state.places.values()))
 
 if __name__ == "__main__":
     main()